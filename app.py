@@ -1,17 +1,25 @@
 # app.py
 from flask import Flask
-from extensions import db, login_manager, migrate
+from extensions import db, login_manager, migrate, assets, compress
 from models import User
 from routes import main_bp
 from config import Config
+from responses import FastJSONProvider
+from stock import record_opening_balances, take_snapshots
+from archive import init_archive, archive_sales, vacuum
+from schema import sync_tables
+import click
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    app.json = FastJSONProvider(app)
 
     db.init_app(app)
     login_manager.init_app(app)
     migrate.init_app(app, db)
+    assets.init_app(app)
+    compress.init_app(app)
 
     login_manager.login_view = 'main.login'
 
@@ -22,13 +30,31 @@ def create_app():
     app.register_blueprint(main_bp)
 
     with app.app_context():
+        init_archive(app)
         db.create_all()
+        sync_tables(db.engine, db.metadata.sorted_tables)
         if not User.query.filter_by(username='admin').first():
             admin_user = User(username='admin', email='admin@pdv.com', role='admin')
             admin_user.set_password('admin123')
             db.session.add(admin_user)
             db.session.commit()
             print("Usuário administrador 'admin' criado com sucesso!")
+        record_opening_balances()
+
+    @app.cli.command('stock-snapshot')
+    def stock_snapshot_command():
+        # Snapshot periódico do estoque (ex.: agendar diariamente no cron)
+        created = take_snapshots()
+        print(f"{created} snapshot(s) de estoque gravado(s).")
+
+    @app.cli.command('archive-sales')
+    @click.option('--months', type=int, default=None, help='Arquiva vendas anteriores a N meses (padrão: ARCHIVE_MONTHS).')
+    def archive_sales_command(months):
+        # Move períodos fechados para os arquivos anuais e compacta o banco principal
+        moved = archive_sales(months if months is not None else app.config['ARCHIVE_MONTHS'])
+        if moved:
+            vacuum()
+        print(f"{moved} venda(s) arquivada(s).")
 
     return app
 
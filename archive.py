@@ -0,0 +1,147 @@
+# archive.py
+import os
+import re
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import MetaData, create_engine, delete, func, insert, select, union_all
+from extensions import db
+from models import Sale, SaleItem
+from schema import sync_tables
+
+# Um arquivo SQLite por ano (sales_2024.db), anexado como arc_2024 só pelas
+# consultas que precisam dele. O SQLite limita a 10 bancos anexados por conexão:
+# passando disso, o `archive-sales` junta os arquivos mais antigos num só
+# (sales_2015-2019.db, anexado como arc_2015_2019).
+ARCHIVE_FILE_RE = re.compile(r'^sales_(\d{4})(?:-(\d{4}))?\.db$')
+MAX_ATTACHED = 10
+
+def archive_dir(app=None):
+    app = app or current_app
+    return app.config.get('ARCHIVE_DIR') or os.path.join(app.instance_path, 'archive')
+
+# Retorna os períodos arquivados como [(primeiro_ano, último_ano), ...]
+def archived_periods(app=None):
+    path = archive_dir(app)
+    if not os.path.isdir(path):
+        return []
+    matches = [m for m in map(ARCHIVE_FILE_RE.match, os.listdir(path)) if m]
+    return sorted((int(m.group(1)), int(m.group(2) or m.group(1))) for m in matches)
+
+def archive_name(period):
+    first, last = period
+    return f'sales_{first}.db' if first == last else f'sales_{first}-{last}.db'
+
+def archive_path(period, app=None):
+    return os.path.join(archive_dir(app), archive_name(period))
+
+def _schema(period):
+    first, last = period
+    return f'arc_{first}' if first == last else f'arc_{first}_{last}'
+
+# Anexa à conexão atual os períodos pedidos. Desanexa os que sumiram do diretório
+# (juntados por outro processo) e, se preciso, os que a consulta não usa, para
+# ficar dentro do limite do SQLite. Deve rodar fora de transação.
+def _use_archives(periods):
+    if len(periods) > MAX_ATTACHED:
+        raise RuntimeError(f'{len(periods)} arquivos de histórico; o SQLite anexa no máximo {MAX_ATTACHED}. Rode `flask archive-sales` para juntar os mais antigos.')
+    conn = db.session.connection()
+    wanted = {_schema(p): p for p in periods}
+    current = {_schema(p) for p in archived_periods()}
+    attached = {row[1] for row in conn.exec_driver_sql('PRAGMA database_list') if row[1].startswith('arc_')}
+    stale = attached - current
+    if len(attached | set(wanted)) > MAX_ATTACHED:
+        stale |= attached - set(wanted)
+    for schema in stale:
+        conn.exec_driver_sql(f'DETACH DATABASE {schema}')
+    for schema, period in wanted.items():
+        if schema not in attached - stale:
+            conn.exec_driver_sql(f'ATTACH DATABASE ? AS {schema}', (archive_path(period),))
+
+def _archive_table(table, period):
+    return table.to_metadata(MetaData(), schema=_schema(period))
+
+# Cria as tabelas no arquivo do período ou acrescenta colunas novas do modelo
+# (ex.: sales.shift_id), mantendo o UNION com as tabelas vivas compatível.
+def _sync_archive_schema(period, app=None):
+    engine = create_engine(f'sqlite:///{archive_path(period, app)}')
+    tables = [Sale.__table__, SaleItem.__table__]
+    db.metadata.create_all(engine, tables=tables)
+    sync_tables(engine, tables)
+    engine.dispose()
+
+def init_archive(app):
+    for period in archived_periods(app):
+        _sync_archive_schema(period, app)
+
+# Retorna (sales, sale_items) cobrindo o intervalo [start, end). Só faz UNION com
+# os períodos arquivados que interceptam o intervalo; sem eles, usa as tabelas vivas.
+def sales_tables(start=None, end=None):
+    periods = [p for p in archived_periods()
+               if (start is None or start < datetime(p[1] + 1, 1, 1)) and (end is None or end > datetime(p[0], 1, 1))]
+    if not periods:
+        return Sale.__table__, SaleItem.__table__
+    _use_archives(periods)
+    sales = union_all(select(Sale.__table__), *[select(_archive_table(Sale.__table__, p)) for p in periods]).subquery('sales')
+    items = union_all(select(SaleItem.__table__), *[select(_archive_table(SaleItem.__table__, p)) for p in periods]).subquery('sale_items')
+    return sales, items
+
+# Move as vendas anteriores ao início do mês de `months` meses atrás para os
+# arquivos anuais e retorna quantas foram movidas. Cada ano é uma transação.
+def archive_sales(months):
+    today = datetime.now()
+    total_months = today.year * 12 + today.month - 1 - months
+    cutoff = datetime(total_months // 12, total_months % 12 + 1, 1)
+
+    sales, items = Sale.__table__, SaleItem.__table__
+    # Mantém sempre a venda mais recente no banco vivo para que o SQLite não
+    # reutilize ids já presentes nos arquivos.
+    max_id = db.session.query(func.max(sales.c.id)).scalar()
+    if max_id is None:
+        return 0
+    eligible = (sales.c.timestamp < cutoff) & (sales.c.id < max_id)
+    years = [int(y) for (y,) in db.session.query(func.strftime('%Y', sales.c.timestamp)).filter(eligible).distinct()]
+    if years:
+        os.makedirs(archive_dir(), exist_ok=True)
+    moved = 0
+    for year in sorted(years):
+        period = next((p for p in archived_periods() if p[0] <= year <= p[1]), None)
+        if period is None:
+            period = (year, year)
+            _sync_archive_schema(period)
+        _use_archives([period])
+        in_year = eligible & (sales.c.timestamp >= datetime(year, 1, 1)) & (sales.c.timestamp < datetime(year + 1, 1, 1))
+        sale_ids = select(sales.c.id).where(in_year)
+        arc_sales, arc_items = _archive_table(sales, period), _archive_table(items, period)
+        db.session.execute(insert(arc_items).from_select(
+            [c.name for c in items.c], select(items).where(items.c.sale_id.in_(sale_ids))))
+        result = db.session.execute(insert(arc_sales).from_select(
+            [c.name for c in sales.c], select(sales).where(in_year)))
+        db.session.execute(delete(items).where(items.c.sale_id.in_(sale_ids)))
+        db.session.execute(delete(sales).where(in_year))
+        db.session.commit()
+        moved += result.rowcount
+
+    while len(archived_periods()) > MAX_ATTACHED:
+        _fold_oldest()
+    return moved
+
+# Junta os dois arquivos mais antigos num só arquivo cobrindo os dois períodos
+def _fold_oldest():
+    older, newer = archived_periods()[:2]
+    folded = (older[0], newer[1])
+    _sync_archive_schema(folded)
+    _use_archives([older, newer, folded])
+    for table in (Sale.__table__, SaleItem.__table__):
+        target = _archive_table(table, folded)
+        for period in (older, newer):
+            db.session.execute(insert(target).from_select(
+                [c.name for c in table.c], select(_archive_table(table, period))))
+    db.session.commit()
+    # Conexões que ainda têm os arquivos antigos anexados os desanexam no próximo
+    # _use_archives, pois eles não aparecem mais no diretório.
+    for period in (older, newer):
+        os.remove(archive_path(period))
+
+def vacuum():
+    with db.engine.connect().execution_options(isolation_level='AUTOCOMMIT') as conn:
+        conn.exec_driver_sql('VACUUM main')
@@ -0,0 +1,84 @@
+# assets.py
+import gzip
+import hashlib
+import mimetypes
+import os
+from flask import Response, abort, current_app, redirect, request, url_for
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele servimos apenas gzip
+    brotli = None
+
+COMPRESSIBLE_TYPES = ('application/javascript', 'text/javascript', 'application/json', 'image/svg+xml', 'image/x-icon', 'image/vnd.microsoft.icon')
+
+class Assets:
+    # Pipeline de arquivos estáticos sem etapa de build: na inicialização calcula
+    # o hash de cada arquivo de static/, pré-comprime as variantes gzip/brotli em
+    # memória e os serve em /assets/ com URL versionada e cache imutável.
+    def __init__(self, app=None):
+        self.files = {}
+        self.urls = {}
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('ASSETS_MAX_AGE', 31536000)
+        app.config.setdefault('ASSETS_MIN_COMPRESS_SIZE', 512)
+        self.build(app.static_folder, app.config['ASSETS_MIN_COMPRESS_SIZE'])
+        app.add_url_rule('/assets/<path:filename>', endpoint='assets', view_func=self.serve)
+        app.jinja_env.globals['asset_url'] = self.url_for
+
+    def build(self, static_folder, min_compress_size):
+        self.files, self.urls = {}, {}
+        for root, _, names in os.walk(static_folder):
+            for name in names:
+                path = os.path.join(root, name)
+                filename = os.path.relpath(path, static_folder).replace(os.sep, '/')
+                with open(path, 'rb') as f:
+                    body = f.read()
+                digest = hashlib.sha256(body).hexdigest()[:12]
+                stem, ext = os.path.splitext(filename)
+                mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+                bodies = {'identity': body}
+                if len(body) >= min_compress_size and (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_TYPES):
+                    variants = {'gzip': gzip.compress(body, compresslevel=9, mtime=0)}
+                    if brotli is not None:
+                        variants['br'] = brotli.compress(body, quality=11)
+                    bodies.update({enc: data for enc, data in variants.items() if len(data) < len(body)})
+                fingerprinted = f'{stem}.{digest}{ext}'
+                self.files[filename] = fingerprinted
+                self.urls[fingerprinted] = {'filename': filename, 'digest': digest, 'mimetype': mimetype, 'bodies': bodies}
+
+    def url_for(self, filename):
+        # Em modo debug os arquivos mudam sem reiniciar o app: usa o /static normal
+        fingerprinted = self.files.get(filename)
+        if current_app.debug or fingerprinted is None:
+            return url_for('static', filename=filename)
+        return url_for('assets', filename=fingerprinted)
+
+    def serve(self, filename):
+        asset = self.urls.get(filename)
+        if asset is None:
+            # Hash antigo (ex.: HTML de antes de um deploy): redireciona para a versão atual
+            stem, ext = os.path.splitext(filename)
+            original = stem.rsplit('.', 1)[0] + ext
+            if original in self.files:
+                return redirect(self.url_for(original))
+            abort(404)
+
+        encoding = 'identity'
+        for candidate in ('br', 'gzip'):
+            if candidate in asset['bodies'] and request.accept_encodings[candidate]:
+                encoding = candidate
+                break
+
+        response = Response(asset['bodies'][encoding], mimetype=asset['mimetype'])
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config['ASSETS_MAX_AGE']
+        response.cache_control.immutable = True
+        response.set_etag(f"{asset['digest']}-{encoding}")
+        return response.make_conditional(request)
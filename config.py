@@ -9,3 +9,10 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     LOGO_PATH = '/static/img/logo.png'
     COMPANY_NAME = 'HOUSEHOT SWING CLUB'
+
+    # Quantidade de movimentações de estoque por produto entre dois snapshots
+    STOCK_SNAPSHOT_INTERVAL = int(os.environ.get('STOCK_SNAPSHOT_INTERVAL') or 100)
+
+    # Arquivamento do histórico de vendas (flask archive-sales)
+    ARCHIVE_DIR = os.environ.get('ARCHIVE_DIR')  # padrão: instance/archive
+    ARCHIVE_MONTHS = int(os.environ.get('ARCHIVE_MONTHS') or 12)
\ No newline at end of file
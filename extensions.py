@@ -2,8 +2,12 @@
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from assets import Assets
+from responses import Compress
 
 # Instancie suas extensões
 db = SQLAlchemy()
 login_manager = LoginManager()
-migrate = Migrate()
\ No newline at end of file
+migrate = Migrate()
+assets = Assets()
+compress = Compress()
\ No newline at end of file
@@ -15,6 +15,7 @@ class User(UserMixin, db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     sales = db.relationship('Sale', backref='operator', lazy=True)
+    shifts = db.relationship('Shift', backref='operator', lazy=True)
 
     def set_password(self, password):
         self.password_hash = generate_password_hash(password, method='pbkdf2:sha256')
@@ -49,6 +50,7 @@ class Sale(db.Model):
     paid_amount = db.Column(db.Float, nullable=False)
     change_amount = db.Column(db.Float, nullable=False)
     timestamp = db.Column(db.DateTime, default=datetime.now)
+    shift_id = db.Column(db.Integer, db.ForeignKey('shifts.id'), nullable=True, index=True)
 
     items = db.relationship('SaleItem', backref='sale', lazy=True, cascade='all, delete-orphan')
 
@@ -59,4 +61,63 @@ class SaleItem(db.Model):
     sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=False)
     product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
     quantity = db.Column(db.Integer, nullable=False)
-    price_at_sale = db.Column(db.Float, nullable=False)
\ No newline at end of file
+    price_at_sale = db.Column(db.Float, nullable=False)
+
+class StockMovement(db.Model):
+    __tablename__ = 'stock_movements'
+    __table_args__ = (
+        db.Index('ix_stock_movements_product_id_id', 'product_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    # Delta assinado: positivo para entradas, negativo para vendas
+    quantity = db.Column(db.Integer, nullable=False)
+    movement_type = db.Column(db.String(20), nullable=False)  # 'venda', 'entrada' ou 'ajuste'
+    sale_id = db.Column(db.Integer, db.ForeignKey('sales.id'), nullable=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=True)
+    note = db.Column(db.String(255), nullable=True)
+    timestamp = db.Column(db.DateTime, default=datetime.now, nullable=False, index=True)
+
+class StockSnapshot(db.Model):
+    __tablename__ = 'stock_snapshots'
+    __table_args__ = (
+        db.Index('ix_stock_snapshots_product_id_taken_at', 'product_id', 'taken_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('products.id'), nullable=False)
+    # Saldo do produto incluindo todas as movimentações até movement_id (inclusive)
+    stock = db.Column(db.Integer, nullable=False)
+    movement_id = db.Column(db.Integer, db.ForeignKey('stock_movements.id'), nullable=False)
+    taken_at = db.Column(db.DateTime, nullable=False)
+
+class Shift(db.Model):
+    __tablename__ = 'shifts'
+    __table_args__ = (
+        db.Index('ix_shifts_user_id_opened_at', 'user_id', 'opened_at'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
+    opened_at = db.Column(db.DateTime, default=datetime.now, nullable=False)
+    closed_at = db.Column(db.DateTime, nullable=True)
+    opening_cash = db.Column(db.Float, default=0, nullable=False)
+    closing_cash = db.Column(db.Float, nullable=True)
+    # Totais mantidos incrementalmente a cada checkout (ver shifts.record_sale)
+    cash_total = db.Column(db.Float, default=0, nullable=False)
+    credit_total = db.Column(db.Float, default=0, nullable=False)
+    debit_total = db.Column(db.Float, default=0, nullable=False)
+    pix_total = db.Column(db.Float, default=0, nullable=False)
+    other_total = db.Column(db.Float, default=0, nullable=False)
+    total_amount = db.Column(db.Float, default=0, nullable=False)
+    sales_count = db.Column(db.Integer, default=0, nullable=False)
+    items_count = db.Column(db.Integer, default=0, nullable=False)
+
+    sales = db.relationship('Sale', backref='shift', lazy=True)
+
+    def is_open(self):
+        return self.closed_at is None
+
+    def expected_cash(self):
+        return self.opening_cash + self.cash_total
@@ -0,0 +1,63 @@
+# responses.py
+import gzip
+import zlib
+from flask import current_app, request
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usamos o json da biblioteca padrão
+    orjson = None
+
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'text/plain', 'application/javascript', 'text/javascript')
+
+class FastJSONProvider(DefaultJSONProvider):
+    # jsonify com orjson quando disponível; datetime e Decimal continuam passando
+    # pelo default do Flask para manter o mesmo formato de saída.
+    sort_keys = False
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs.get('indent'):
+            options = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+            return orjson.dumps(obj, default=self.default, option=options).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+def columnar(columns, rows):
+    # Formato dos relatórios grandes: {'columns': [...], 'rows': [[...], ...]},
+    # sem repetir as chaves em cada linha (ver fromColumns em reports.html).
+    return {'columns': list(columns), 'rows': rows}
+
+class Compress:
+    # Compressão gzip/deflate das respostas acima de COMPRESS_MIN_SIZE bytes,
+    # conforme o Accept-Encoding do cliente. Respostas com ETag (ex.: /assets,
+    # que já negocia suas variantes) ficam como estão para que o ETag continue
+    # identificando uma única representação.
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('COMPRESS_MIN_SIZE', 1024)
+        app.config.setdefault('COMPRESS_LEVEL', 6)
+        app.after_request(self.compress_response)
+
+    def compress_response(self, response):
+        if (response.direct_passthrough or response.is_streamed
+                or response.status_code < 200 or response.status_code in (204, 206, 304)
+                or 'Content-Encoding' in response.headers or 'ETag' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+        response.vary.add('Accept-Encoding')
+        if response.content_length is None or response.content_length < current_app.config['COMPRESS_MIN_SIZE']:
+            return response
+
+        level = current_app.config['COMPRESS_LEVEL']
+        if request.accept_encodings['gzip']:
+            encoding, body = 'gzip', gzip.compress(response.get_data(), compresslevel=level, mtime=0)
+        elif request.accept_encodings['deflate']:
+            encoding, body = 'deflate', zlib.compress(response.get_data(), level)
+        else:
+            return response
+        response.set_data(body)
+        response.headers['Content-Encoding'] = encoding
+        return response
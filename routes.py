@@ -6,12 +6,19 @@ from datetime import datetime, timedelta, date
 import json
 from functools import wraps
 import io
+import math
+import zipfile
 import time
 import os
 from sqlalchemy import or_, func
+from sqlalchemy.orm import joinedload
 from werkzeug.security import generate_password_hash 
 
-from models import User, Product, Sale, SaleItem
+from models import User, Product, Sale, SaleItem, Shift
+from stock import record_movement, stock_as_of, ledger_start
+from archive import sales_tables, archived_periods, archive_name, archive_path
+from responses import columnar
+from shifts import current_shift, open_shift, close_shift, record_sale, shift_summary, shift_receipt_html
 
 main_bp = Blueprint('main', __name__)
 
@@ -60,24 +67,26 @@ def dashboard():
 @main_bp.route('/reports/top_products')
 @admin_required
 def top_products_api():
+    sale_items = sales_tables()[1]
     top_products_data = db.session.query(
         Product.name, 
-        func.sum(SaleItem.quantity).label('quantity'),
-        func.sum(SaleItem.quantity * SaleItem.price_at_sale).label('revenue')
-    ).join(SaleItem).group_by(Product.id).order_by(func.sum(SaleItem.quantity).desc()).limit(10).all()
+        func.sum(sale_items.c.quantity).label('quantity'),
+        func.sum(sale_items.c.quantity * sale_items.c.price_at_sale).label('revenue')
+    ).join(sale_items, sale_items.c.product_id == Product.id).group_by(Product.id).order_by(func.sum(sale_items.c.quantity).desc()).limit(10).all()
     return jsonify([{'name': p.name, 'quantity': int(p.quantity), 'revenue': float(p.revenue)} for p in top_products_data])
 
 @main_bp.route('/reports/abc_curve')
 @admin_required
 def abc_curve_api():
-    # Busca todos os produtos e sua receita total
+    # Busca todos os produtos e sua receita total (incluindo o histórico arquivado)
+    sale_items = sales_tables()[1]
     data = db.session.query(
         Product.name,
-        func.sum(SaleItem.quantity * SaleItem.price_at_sale).label('revenue')
-    ).join(SaleItem).group_by(Product.id).order_by(func.sum(SaleItem.quantity * SaleItem.price_at_sale).desc()).all()
+        func.sum(sale_items.c.quantity * sale_items.c.price_at_sale).label('revenue')
+    ).join(sale_items, sale_items.c.product_id == Product.id).group_by(Product.id).order_by(func.sum(sale_items.c.quantity * sale_items.c.price_at_sale).desc()).all()
     
     total_revenue = sum(p.revenue for p in data) if data else 0
-    abc_data = []
+    abc_rows = []
     cumulative_revenue = 0
     
     for p in data:
@@ -91,23 +100,20 @@ def abc_curve_api():
         else:
             category = 'C'
             
-        abc_data.append({
-            'name': p.name,
-            'revenue': float(p.revenue),
-            'cumulative_percentage': float(percentage),
-            'category': category
-        })
+        abc_rows.append([p.name, float(p.revenue), float(percentage), category])
         
-    return jsonify(abc_data)
+    return jsonify(columnar(['name', 'revenue', 'cumulative_percentage', 'category'], abc_rows))
 
 @main_bp.route('/reports/daily_sales')
 @admin_required
 def daily_sales_api():
     today = datetime.now().date()
+    start = datetime.combine(today - timedelta(days=6), datetime.min.time())
+    sales = sales_tables(start, start + timedelta(days=7))[0]
     sales_data = []
     for i in range(6, -1, -1):
         day = today - timedelta(days=i)
-        revenue = db.session.query(func.sum(Sale.total_amount)).filter(func.date(Sale.timestamp) == day).scalar() or 0
+        revenue = db.session.query(func.sum(sales.c.total_amount)).filter(func.date(sales.c.timestamp) == day).scalar() or 0
         sales_data.append({'date': day.strftime('%d/%m'), 'revenue': float(revenue)})
     return jsonify(sales_data)
 
@@ -116,21 +122,33 @@ def daily_sales_api():
 def cash_flow_api():
     start_date = request.args.get('start_date')
     end_date = request.args.get('end_date')
-    query = Sale.query
-    if start_date: query = query.filter(Sale.timestamp >= datetime.strptime(start_date, '%Y-%m-%d'))
-    if end_date: query = query.filter(Sale.timestamp < datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1))
+    start = datetime.strptime(start_date, '%Y-%m-%d') if start_date else None
+    end = datetime.strptime(end_date, '%Y-%m-%d') + timedelta(days=1) if end_date else None
+    sales_t, items_t = sales_tables(start, end)
+    period = []
+    if start: period.append(sales_t.c.timestamp >= start)
+    if end: period.append(sales_t.c.timestamp < end)
     
-    sales = query.order_by(Sale.timestamp.asc()).all()
+    sales = db.session.query(
+        sales_t.c.id, sales_t.c.timestamp, sales_t.c.total_amount, sales_t.c.payment_method, User.username
+    ).join(User, User.id == sales_t.c.user_id).filter(*period).order_by(sales_t.c.timestamp.asc()).all()
+    items_by_sale = {}
+    items = db.session.query(
+        items_t.c.sale_id, items_t.c.quantity, items_t.c.price_at_sale, Product.name
+    ).join(sales_t, sales_t.c.id == items_t.c.sale_id).join(Product, Product.id == items_t.c.product_id).filter(*period).order_by(items_t.c.id.asc())
+    for item in items:
+        items_by_sale.setdefault(item.sale_id, []).append(item)
     operators_data = {}
     total_general = 0
     
     for sale in sales:
-        op_name = sale.operator.username
+        op_name = sale.username
         if op_name not in operators_data: 
             operators_data[op_name] = {
                 'Dinheiro': 0, 'Cartao Credito': 0, 'Cartao Debito': 0, 'Pix': 0, 
                 'Total': 0, 'VendasCount': 0, 'detalhes': []
             }
+        detalhes = operators_data[op_name]['detalhes']
         
         method = sale.payment_method
         if method in operators_data[op_name]: 
@@ -140,29 +158,40 @@ def cash_flow_api():
         operators_data[op_name]['VendasCount'] += 1
         total_general += sale.total_amount
         
-        for item in sale.items:
-            operators_data[op_name]['detalhes'].append({
-                'hora': sale.timestamp.strftime('%H:%M:%S'),
-                'data': sale.timestamp.strftime('%d/%m/%Y'),
-                'produto': item.product.name,
-                'quantidade': item.quantity,
-                'valor': float(item.price_at_sale * item.quantity),
-                'metodo': sale.payment_method
-            })
+        hora, data = sale.timestamp.strftime('%H:%M:%S'), sale.timestamp.strftime('%d/%m/%Y')
+        for item in items_by_sale.get(sale.id, []):
+            detalhes.append([hora, data, item.name, item.quantity, float(item.price_at_sale * item.quantity), sale.payment_method])
+    
+    for values in operators_data.values():
+        values['detalhes'] = columnar(['hora', 'data', 'produto', 'quantidade', 'valor', 'metodo'], values['detalhes'])
             
     return jsonify({'operators': operators_data, 'total_general': float(total_general)})
 
 @main_bp.route('/reports/stock')
 @admin_required
 def stock_report_api():
-    products = Product.query.all()
+    as_of = request.args.get('as_of')
+    balances = None
+    if as_of:
+        try:
+            as_of_date = datetime.strptime(as_of, '%Y-%m-%d')
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Data inválida para as_of (use AAAA-MM-DD).'}), 400
+        start = ledger_start()
+        if start is None or as_of_date.date() < start.date():
+            since = start.strftime('%d/%m/%Y') if start else 'hoje'
+            return jsonify({'success': False, 'message': f'O histórico de estoque só está disponível a partir de {since}.'}), 400
+        # Com as_of, o saldo vem do livro de estoque (snapshot + movimentações até o fim do dia)
+        balances = stock_as_of(as_of_date + timedelta(days=1))
+    products = db.session.query(Product.id, Product.name, Product.price, Product.stock).all()
     product_list = []
     total_value = 0
     for p in products:
-        val = p.price * p.stock
-        product_list.append({'name': p.name, 'stock': p.stock, 'price': float(p.price), 'value': float(val)})
+        stock = balances.get(p.id, 0) if balances is not None else p.stock
+        val = p.price * stock
+        product_list.append([p.name, stock, float(p.price), float(val)])
         total_value += val
-    return jsonify({'products': product_list, 'total_value': float(total_value)})
+    return jsonify({'products': columnar(['name', 'stock', 'price', 'value'], product_list), 'total_value': float(total_value), 'as_of': as_of})
 
 @main_bp.route('/products')
 @admin_required
@@ -180,6 +209,8 @@ def add_product():
         if form.return_alert_days.data: new_product.return_alert_days = form.return_alert_days.data
         try:
             db.session.add(new_product)
+            db.session.flush()
+            if new_product.stock: record_movement(new_product, new_product.stock, 'entrada', user_id=current_user.id, note='Cadastro do produto')
             db.session.commit()
             flash('Produto adicionado!', 'success')
             return redirect(url_for('main.products'))
@@ -194,8 +225,10 @@ def edit_product(product_id):
     product = Product.query.get_or_404(product_id)
     form = ProductForm(obj=product)
     if form.validate_on_submit():
+        old_stock = product.stock
         form.populate_obj(product)
         if not product.barcode or not product.barcode.strip(): product.barcode = f"INT-{int(time.time())}"
+        if product.stock != old_stock: record_movement(product, product.stock - old_stock, 'ajuste', user_id=current_user.id, note='Edição do produto')
         db.session.commit()
         return redirect(url_for('main.products'))
     return render_template('add_edit_product.html', title='Editar Produto', form=form)
@@ -204,7 +237,8 @@ def edit_product(product_id):
 @admin_required
 def delete_product(product_id):
     product = Product.query.get_or_404(product_id)
-    has_sales = SaleItem.query.filter_by(product_id=product_id).first()
+    sale_items = sales_tables()[1]
+    has_sales = db.session.query(sale_items.c.id).filter(sale_items.c.product_id == product_id).first()
     if has_sales:
         flash('Não é possível excluir este produto pois ele possui vendas registradas. Você pode apenas editá-lo.', 'danger')
         return redirect(url_for('main.products'))
@@ -234,7 +268,9 @@ def pdv_search_product():
 def pdv_checkout():
     data = request.get_json()
     try:
-        new_sale = Sale(user_id=current_user.id, total_amount=data['total_amount'], payment_method=data['payment_method'], paid_amount=data['paid_amount'], change_amount=data['change_amount'])
+        # Venda sem turno aberto abre um automaticamente (troco inicial zero)
+        shift = current_shift(current_user.id) or open_shift(current_user.id)
+        new_sale = Sale(user_id=current_user.id, shift_id=shift.id, total_amount=data['total_amount'], payment_method=data['payment_method'], paid_amount=data['paid_amount'], change_amount=data['change_amount'])
         db.session.add(new_sale)
         db.session.flush()
         
@@ -249,15 +285,89 @@ def pdv_checkout():
                 return jsonify({'success': False, 'message': f'Sem estoque para {item["name"]}'}), 400
             db.session.add(SaleItem(sale_id=new_sale.id, product_id=p.id, quantity=item['quantity'], price_at_sale=item['price']))
             p.stock -= item['quantity']
+            record_movement(p, -item['quantity'], 'venda', sale_id=new_sale.id, user_id=current_user.id)
             for _ in range(item['quantity']):
                 counter += 1
                 all_receipts.append(f"""<div class="receipt-container" style="font-weight: bold; margin-bottom: 70px; text-align: center; font-family: sans-serif;"><p style="font-size: 1.5em; margin: 0;">HOUSEHOT SWING CLUB</p><p style="margin: 5px 0;">VENDA: #{new_sale.id}</p><p style="margin: 2px 0;">DATA: {current_time_str}</p><hr style="border-top: 1px dashed #000;"><p>Item {counter} de {sum(i['quantity'] for i in data['cart'])}</p><p style="font-size: 1.6em; border: 2px solid #000; padding: 10px; margin: 10px 0; text-transform: uppercase;">{item['name']}</p><p>1 UN x R$ {item['price']:.2f}</p><hr style="border-top: 1px dashed #000;"><p style="font-size: 1.1em;">PAGAMENTO: {data['payment_method']}</p><p>VALOR PAGO: R$ {data['paid_amount']:.2f}</p><p>TROCO: R$ {data['change_amount']:.2f}</p><hr style="border-top: 1px dashed #000;"><p>Obrigado pela preferência!</p></div>""")
+        record_sale(shift.id, new_sale.payment_method, new_sale.total_amount, counter)
         db.session.commit()
         return jsonify({'success': True, 'receipt_htmls': all_receipts})
     except Exception as e:
         db.session.rollback()
         return jsonify({'success': False, 'message': str(e)}), 500
 
+def _parse_amount(value):
+    # Valor opcional em R$ vindo do PDV; None quando ausente, ValueError se inválido.
+    # Texto digitado aceita vírgula decimal ("150,50", "1.234,56").
+    if isinstance(value, bool):
+        raise ValueError(value)
+    if isinstance(value, str):
+        value = value.replace('R$', '').strip()
+        if ',' in value:
+            value = value.replace('.', '').replace(',', '.')
+    if value in (None, ''):
+        return None
+    amount = float(value)
+    if not math.isfinite(amount) or amount < 0:
+        raise ValueError(value)
+    return amount
+
+@main_bp.route('/shift/current')
+@login_required
+def shift_current():
+    shift = current_shift(current_user.id)
+    return jsonify({'shift': shift_summary(shift) if shift else None})
+
+@main_bp.route('/shift/open', methods=['POST'])
+@login_required
+def shift_open():
+    if current_shift(current_user.id):
+        return jsonify({'success': False, 'message': 'Já existe um caixa aberto para este operador.'}), 400
+    data = request.get_json(silent=True) or {}
+    try:
+        opening_cash = _parse_amount(data.get('opening_cash')) or 0
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Troco inicial inválido.'}), 400
+    shift = open_shift(current_user.id, opening_cash)
+    db.session.commit()
+    return jsonify({'success': True, 'shift': shift_summary(shift)})
+
+@main_bp.route('/shift/close', methods=['POST'])
+@login_required
+def shift_close():
+    shift = current_shift(current_user.id)
+    if not shift:
+        return jsonify({'success': False, 'message': 'Nenhum caixa aberto para este operador.'}), 400
+    data = request.get_json(silent=True) or {}
+    try:
+        closing_cash = _parse_amount(data.get('closing_cash'))
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': 'Valor contado inválido.'}), 400
+    close_shift(shift, closing_cash)
+    db.session.commit()
+    summary = shift_summary(shift)
+    return jsonify({'success': True, 'shift': summary, 'receipt_html': shift_receipt_html(summary)})
+
+@main_bp.route('/shift/<int:shift_id>')
+@login_required
+def shift_detail(shift_id):
+    shift = Shift.query.get_or_404(shift_id)
+    if shift.user_id != current_user.id and not current_user.is_admin():
+        return jsonify({'success': False, 'message': 'Sem permissão para este caixa.'}), 403
+    summary = shift_summary(shift)
+    return jsonify({'shift': summary, 'receipt_html': shift_receipt_html(summary)})
+
+@main_bp.route('/shifts')
+@login_required
+def shifts_list():
+    query = Shift.query
+    if not current_user.is_admin():
+        query = query.filter_by(user_id=current_user.id)
+    elif request.args.get('user_id', type=int):
+        query = query.filter_by(user_id=request.args.get('user_id', type=int))
+    page = query.options(joinedload(Shift.operator)).order_by(Shift.opened_at.desc()).paginate(page=request.args.get('page', 1, type=int), per_page=50, error_out=False)
+    return jsonify({'shifts': [shift_summary(s) for s in page.items], 'page': page.page, 'pages': page.pages, 'total': page.total})
+
 @main_bp.route('/users')
 @admin_required
 def users():
@@ -284,10 +394,14 @@ def delete_user(user_id):
         flash('Não é possível excluir o administrador principal.', 'danger')
         return redirect(url_for('main.users'))
     
-    has_sales = Sale.query.filter_by(user_id=user_id).first()
+    sales = sales_tables()[0]
+    has_sales = db.session.query(sales.c.id).filter(sales.c.user_id == user_id).first()
     if has_sales:
         flash('Não é possível excluir este usuário pois ele possui vendas registradas. Você pode apenas editá-lo.', 'danger')
         return redirect(url_for('main.users'))
+    if Shift.query.filter_by(user_id=user_id).first():
+        flash('Não é possível excluir este usuário pois ele possui caixas registrados. Você pode apenas editá-lo.', 'danger')
+        return redirect(url_for('main.users'))
         
     db.session.delete(user)
     db.session.commit()
@@ -304,10 +418,13 @@ def reports():
 def sales_by_period_report():
     s_date = request.args.get('start_date')
     e_date = request.args.get('end_date')
-    query = Sale.query
-    if s_date: query = query.filter(Sale.timestamp >= datetime.strptime(s_date, '%Y-%m-%d'))
-    if e_date: query = query.filter(Sale.timestamp < datetime.strptime(e_date, '%Y-%m-%d') + timedelta(days=1))
-    sales = query.order_by(Sale.timestamp.desc()).all()
+    start = datetime.strptime(s_date, '%Y-%m-%d') if s_date else None
+    end = datetime.strptime(e_date, '%Y-%m-%d') + timedelta(days=1) if e_date else None
+    sales_t = sales_tables(start, end)[0]
+    query = db.session.query(sales_t, User.username.label('operator_name')).join(User, User.id == sales_t.c.user_id)
+    if start: query = query.filter(sales_t.c.timestamp >= start)
+    if end: query = query.filter(sales_t.c.timestamp < end)
+    sales = query.order_by(sales_t.c.timestamp.desc()).all()
     return render_template('reports_sales_by_period.html', sales=sales, total_sales_count=len(sales), total_revenue=sum(s.total_amount for s in sales), start_date=s_date, end_date=e_date)
 
 @main_bp.route('/backup/download')
@@ -315,7 +432,17 @@ def sales_by_period_report():
 def download_backup():
     try:
         db_path = os.path.join(current_app.instance_path, 'pdv.db')
-        return send_file(db_path, as_attachment=True, download_name=f'backup_pdv_{date.today()}.db')
+        periods = archived_periods()
+        if not periods:
+            return send_file(db_path, as_attachment=True, download_name=f'backup_pdv_{date.today()}.db')
+        # Com histórico arquivado, o backup leva o banco principal e os arquivos de histórico
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.write(db_path, 'pdv.db')
+            for period in periods:
+                zf.write(archive_path(period), f'archive/{archive_name(period)}')
+        buffer.seek(0)
+        return send_file(buffer, as_attachment=True, download_name=f'backup_pdv_{date.today()}.zip', mimetype='application/zip')
     except Exception as e:
         flash(f'Erro ao gerar backup: {str(e)}', 'danger')
         return redirect(url_for('main.dashboard'))
\ No newline at end of file
@@ -0,0 +1,20 @@
+# schema.py
+from sqlalchemy import inspect
+
+# db.create_all só cria tabelas que não existem; aqui acrescentamos às tabelas
+# já existentes as colunas e índices novos do modelo (ex.: sales.shift_id). O
+# ALTER TABLE do SQLite só adiciona colunas anuláveis, então entram sem NOT NULL.
+def sync_tables(engine, tables):
+    with engine.begin() as conn:
+        inspector = inspect(conn)
+        for table in tables:
+            if not inspector.has_table(table.name):
+                continue
+            existing = {c['name'] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.exec_driver_sql(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(engine.dialect)}')
+            indexes = {i['name'] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
@@ -0,0 +1,64 @@
+# shifts.py
+from datetime import datetime
+from flask import current_app
+from extensions import db
+from models import Shift
+
+# Coluna de Shift que acumula cada forma de pagamento do PDV
+PAYMENT_TOTAL_COLUMNS = {
+    'Dinheiro': 'cash_total',
+    'Cartao Credito': 'credit_total',
+    'Cartao Debito': 'debit_total',
+    'Pix': 'pix_total',
+}
+
+def current_shift(user_id):
+    return Shift.query.filter_by(user_id=user_id, closed_at=None).order_by(Shift.id.desc()).first()
+
+def open_shift(user_id, opening_cash=0):
+    shift = Shift(user_id=user_id, opening_cash=opening_cash or 0, opened_at=datetime.now())
+    db.session.add(shift)
+    db.session.flush()
+    return shift
+
+def close_shift(shift, closing_cash=None):
+    shift.closed_at = datetime.now()
+    shift.closing_cash = closing_cash
+    return shift
+
+# Soma a venda aos totais do turno com um UPDATE relativo (col = col + valor),
+# para que checkouts simultâneos do mesmo turno não se sobrescrevam.
+def record_sale(shift_id, payment_method, amount, items_count):
+    column = getattr(Shift, PAYMENT_TOTAL_COLUMNS.get(payment_method, 'other_total'))
+    Shift.query.filter_by(id=shift_id).update({
+        column: column + amount,
+        Shift.total_amount: Shift.total_amount + amount,
+        Shift.sales_count: Shift.sales_count + 1,
+        Shift.items_count: Shift.items_count + items_count,
+    }, synchronize_session=False)
+
+def shift_summary(shift):
+    # Mesmas chaves por forma de pagamento usadas em cash_flow_api
+    summary = {method: float(getattr(shift, column)) for method, column in PAYMENT_TOTAL_COLUMNS.items()}
+    difference = shift.closing_cash - shift.expected_cash() if shift.closing_cash is not None else None
+    summary.update({
+        'id': shift.id,
+        'operator': shift.operator.username,
+        'opened_at': shift.opened_at.strftime('%d/%m/%Y %H:%M:%S'),
+        'closed_at': shift.closed_at.strftime('%d/%m/%Y %H:%M:%S') if shift.closed_at else None,
+        'opening_cash': float(shift.opening_cash),
+        'closing_cash': float(shift.closing_cash) if shift.closing_cash is not None else None,
+        'Outros': float(shift.other_total),
+        'Total': float(shift.total_amount),
+        'VendasCount': shift.sales_count,
+        'items_count': shift.items_count,
+        'expected_cash': float(shift.expected_cash()),
+        'difference': float(difference) if difference is not None else None,
+    })
+    return summary
+
+def shift_receipt_html(summary):
+    rows = ''.join(f'<p style="margin: 2px 0;">{label}: R$ {summary[key]:.2f}</p>' for label, key in (
+        ('DINHEIRO', 'Dinheiro'), ('CARTÃO CRÉDITO', 'Cartao Credito'), ('CARTÃO DÉBITO', 'Cartao Debito'), ('PIX', 'Pix')))
+    counted = f"<p>VALOR CONTADO: R$ {summary['closing_cash']:.2f}</p><p>DIFERENÇA: R$ {summary['difference']:.2f}</p>" if summary['closing_cash'] is not None else ''
+    return f"""<div class="receipt-container" style="font-weight: bold; margin-bottom: 70px; text-align: center; font-family: sans-serif;"><p style="font-size: 1.5em; margin: 0;">{current_app.config['COMPANY_NAME']}</p><p style="margin: 5px 0;">FECHAMENTO DE CAIXA #{summary['id']}</p><p style="margin: 2px 0;">OPERADOR: {summary['operator']}</p><p style="margin: 2px 0;">ABERTURA: {summary['opened_at']}</p><p style="margin: 2px 0;">FECHAMENTO: {summary['closed_at'] or '-'}</p><hr style="border-top: 1px dashed #000;">{rows}<p style="font-size: 1.2em;">TOTAL: R$ {summary['Total']:.2f}</p><p>VENDAS: {summary['VendasCount']} | ITENS: {summary['items_count']}</p><hr style="border-top: 1px dashed #000;"><p>TROCO INICIAL: R$ {summary['opening_cash']:.2f}</p><p>DINHEIRO ESPERADO: R$ {summary['expected_cash']:.2f}</p>{counted}</div>"""
@@ -16,6 +16,9 @@
         const printReceiptModal = new bootstrap.Modal(document.getElementById('printReceiptModal'));
         const receiptContent = document.getElementById('receipt-content');
         const printAllBtn = document.getElementById('print-all-btn');
+        const shiftStatus = document.getElementById('shift-status');
+        const openShiftBtn = document.getElementById('open-shift-btn');
+        const closeShiftBtn = document.getElementById('close-shift-btn');
 
         let cart = [];
         let receipts = [];
@@ -211,6 +214,7 @@
                     printAllReceipts();
                     cart = []; 
                     updateCart();
+                    refreshShift();
                 } else alert('Erro: ' + res.message);
             })
             .catch(() => alert('Erro na comunicação com o servidor'));
@@ -236,6 +240,54 @@
 
         printAllBtn.onclick = () => printAllReceipts();
 
+        // Turno do operador (abertura e fechamento de caixa)
+        function showShift(shift) {
+            openShiftBtn.disabled = !!shift;
+            closeShiftBtn.disabled = !shift;
+            shiftStatus.textContent = shift
+                ? `Caixa #${shift.id} aberto em ${shift.opened_at} - ${shift.VendasCount} venda(s), R$ ${shift.Total.toFixed(2)}`
+                : 'Nenhum caixa aberto (será aberto na primeira venda).';
+        }
+
+        function refreshShift() {
+            fetch('/shift/current').then(r => r.json()).then(res => showShift(res.shift));
+        }
+
+        openShiftBtn.onclick = () => {
+            const openingCash = prompt('Troco inicial (R$):', '0,00');
+            if (openingCash === null) return;
+            // O texto vai como digitado; o servidor valida e aceita vírgula decimal
+            fetch('/shift/open', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ opening_cash: openingCash.trim() })
+            })
+            .then(r => r.json()).then(res => {
+                if (res.success) showShift(res.shift);
+                else alert('Erro: ' + res.message);
+            })
+            .catch(() => alert('Erro na comunicação com o servidor'));
+        };
+
+        closeShiftBtn.onclick = () => {
+            const closingCash = prompt('Valor em dinheiro contado na gaveta (R$):');
+            if (closingCash === null) return;
+            fetch('/shift/close', {
+                method: 'POST',
+                headers: {'Content-Type': 'application/json'},
+                body: JSON.stringify({ closing_cash: closingCash.trim() })
+            })
+            .then(r => r.json()).then(res => {
+                if (res.success) {
+                    receipts = [res.receipt_html];
+                    printAllReceipts();
+                    showShift(null);
+                } else alert('Erro: ' + res.message);
+            })
+            .catch(() => alert('Erro na comunicação com o servidor'));
+        };
+
         updateCart();
+        refreshShift();
     });
 })();
\ No newline at end of file
@@ -0,0 +1,107 @@
+# stock.py
+from datetime import datetime
+from flask import current_app
+from sqlalchemy import exists, func, insert, literal, select
+from sqlalchemy.orm import aliased
+from extensions import db
+from models import Product, StockMovement, StockSnapshot
+
+MOVEMENT_TYPES = ('venda', 'entrada', 'ajuste')
+
+# Registra uma movimentação no livro de estoque (append-only). Não altera
+# Product.stock: quem chama faz isso na mesma transação. A cada
+# STOCK_SNAPSHOT_INTERVAL movimentações do produto grava um snapshot do saldo.
+def record_movement(product, quantity, movement_type, sale_id=None, user_id=None, note=None):
+    if movement_type not in MOVEMENT_TYPES:
+        raise ValueError(f'Tipo de movimentação inválido: {movement_type}')
+    movement = StockMovement(product_id=product.id, quantity=quantity, movement_type=movement_type,
+                             sale_id=sale_id, user_id=user_id, note=note, timestamp=datetime.now())
+    db.session.add(movement)
+    db.session.flush()
+
+    interval = current_app.config.get('STOCK_SNAPSHOT_INTERVAL', 100)
+    last, pending_count, pending_sum = _pending_since_snapshot(product.id)
+    if pending_count >= interval:
+        _add_snapshot(product.id, last, pending_sum, movement)
+    return movement
+
+# Soma as movimentações após o último snapshot até `upto_id` (inclusive), para
+# que o saldo e o movement_id do snapshot descrevam o mesmo ponto do livro.
+def _pending_since_snapshot(product_id, upto_id=None):
+    last = StockSnapshot.query.filter_by(product_id=product_id).order_by(StockSnapshot.movement_id.desc()).first()
+    since = last.movement_id if last else 0
+    query = db.session.query(
+        func.count(StockMovement.id),
+        func.coalesce(func.sum(StockMovement.quantity), 0)
+    ).filter(StockMovement.product_id == product_id, StockMovement.id > since)
+    if upto_id is not None:
+        query = query.filter(StockMovement.id <= upto_id)
+    count, total = query.one()
+    return last, count, total
+
+def _add_snapshot(product_id, last, pending_sum, movement):
+    snapshot = StockSnapshot(product_id=product_id, stock=(last.stock if last else 0) + pending_sum,
+                             movement_id=movement.id, taken_at=movement.timestamp)
+    db.session.add(snapshot)
+    return snapshot
+
+# Grava um snapshot para cada produto com movimentações desde o último snapshot
+def take_snapshots():
+    created = 0
+    product_ids = [pid for (pid,) in db.session.query(StockMovement.product_id).distinct()]
+    for product_id in product_ids:
+        # Lê a última movimentação antes de somar: uma venda gravada entre as duas
+        # leituras fica fora do snapshot e entra no próximo.
+        movement = StockMovement.query.filter_by(product_id=product_id).order_by(StockMovement.id.desc()).first()
+        last, pending_count, pending_sum = _pending_since_snapshot(product_id, movement.id)
+        if not pending_count:
+            continue
+        _add_snapshot(product_id, last, pending_sum, movement)
+        created += 1
+    db.session.commit()
+    return created
+
+# Lança como 'ajuste' inicial a diferença entre o estoque atual e o livro dos
+# produtos que ainda não têm saldo inicial. É um único INSERT ... SELECT: o
+# SQLite pega o lock de escrita antes de ler, então vários workers subindo ao
+# mesmo tempo (gunicorn -w N, comandos `flask`) não lançam o saldo duas vezes.
+OPENING_NOTE = 'Saldo inicial'
+
+def record_opening_balances():
+    movement = aliased(StockMovement)
+    booked = select(func.coalesce(func.sum(movement.quantity), 0)).where(
+        movement.product_id == Product.id).scalar_subquery()
+    has_opening = exists().where(movement.product_id == Product.id, movement.note == OPENING_NOTE)
+    source = select(
+        Product.id, Product.stock - booked, literal('ajuste'), literal(OPENING_NOTE), literal(datetime.now(), db.DateTime)
+    ).where(~has_opening, Product.stock != booked)
+    result = db.session.execute(insert(StockMovement).from_select(
+        ['product_id', 'quantity', 'movement_type', 'note', 'timestamp'], source))
+    db.session.commit()
+    return result.rowcount
+
+# Data da primeira movimentação; antes dela o livro não sabe o saldo dos produtos
+def ledger_start():
+    return db.session.query(func.min(StockMovement.timestamp)).scalar()
+
+# Retorna {product_id: saldo} antes de as_of: parte do último snapshot de cada
+# produto e soma só as movimentações posteriores, sem reprocessar o histórico.
+def stock_as_of(as_of):
+    latest = db.session.query(
+        func.max(StockSnapshot.id).label('id')
+    ).filter(StockSnapshot.taken_at < as_of).group_by(StockSnapshot.product_id).subquery()
+    snapshots = db.session.query(
+        StockSnapshot.product_id, StockSnapshot.stock, StockSnapshot.movement_id
+    ).join(latest, StockSnapshot.id == latest.c.id).subquery()
+
+    balances = {row.product_id: row.stock for row in db.session.query(snapshots)}
+    deltas = db.session.query(
+        StockMovement.product_id,
+        func.sum(StockMovement.quantity).label('delta')
+    ).outerjoin(snapshots, snapshots.c.product_id == StockMovement.product_id).filter(
+        StockMovement.timestamp < as_of,
+        StockMovement.id > func.coalesce(snapshots.c.movement_id, 0)
+    ).group_by(StockMovement.product_id)
+    for row in deltas:
+        balances[row.product_id] = balances.get(row.product_id, 0) + int(row.delta)
+    return balances
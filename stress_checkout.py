@@ -0,0 +1,371 @@
+# stress_checkout.py
+#
+# Simula N caixas fazendo checkout ao mesmo tempo contra o mesmo pdv.db e mede
+# contenção: erros de lock, retentativas, checkouts recusados, vazão e a
+# consistência final do estoque (Product.stock x SaleItem x livro de estoque).
+#
+# lock_error_s soma o tempo das tentativas que falharam por lock e das esperas
+# entre retentativas. lock_wait_s (só com o test client, que roda no mesmo
+# processo) soma o tempo gasto dentro de INSERT/UPDATE/DELETE e COMMIT no
+# SQLite, onde o busy timeout espera pelo lock de escrita; inclui a própria
+# escrita, que sem contenção leva microssegundos. Com --url esse tempo fica no
+# servidor e o relatório traz lock_wait_s = null.
+#
+#   python stress_checkout.py --registers 8 --mode threads --duration 30
+#   python stress_checkout.py --registers 4 --mode processes --hot-skus 2 --hot-ratio 0.8
+#   python stress_checkout.py --url http://127.0.0.1:5001 --database-url sqlite:////caminho/instance/pdv.db
+#
+# Sem --url, cria um banco temporário (ou usa --database-url), cadastra produtos e
+# operadores e usa o test client do Flask. Cada execução acrescenta uma linha JSON
+# em --report (padrão: pdv_stress_report.jsonl no diretório temporário) para
+# acompanhar a evolução ao longo do tempo.
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import re
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import HTTPCookieProcessor, Request, build_opener
+
+PAYMENT_METHODS = ['Dinheiro', 'Cartao Credito', 'Cartao Debito', 'Pix']
+REGISTER_PASSWORD = 'caixa123'
+
+BARRIER_TIMEOUT = 120
+
+_app = None
+# O test client atende a requisição na thread do caixa: cada caixa acumula aqui
+# o tempo de escrita/lock das suas próprias requisições.
+_write_time = threading.local()
+
+def _add_write_time(seconds):
+    _write_time.total = getattr(_write_time, 'total', 0.0) + seconds
+
+def write_time():
+    return getattr(_write_time, 'total', 0.0)
+
+class TimedConnection(sqlite3.Connection):
+    # O COMMIT espera o lock exclusivo do SQLite; mede o tempo gasto nele
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            return super().commit()
+        finally:
+            _add_write_time(time.perf_counter() - started)
+
+def instrument_writes(engine):
+    from sqlalchemy import event
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def before_execute(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE'):
+            conn.info['write_started'] = time.perf_counter()
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def after_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info.pop('write_started', None)
+        if started is not None:
+            _add_write_time(time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def on_error(context):
+        started = context.connection.info.pop('write_started', None) if context.connection is not None else None
+        if started is not None:
+            _add_write_time(time.perf_counter() - started)
+
+def get_app():
+    # Um app por processo; no modo threads todos os caixas compartilham o mesmo
+    global _app
+    if _app is None:
+        from app import create_app
+        from config import Config
+        from extensions import db
+        Config.SQLALCHEMY_ENGINE_OPTIONS = {'connect_args': {'factory': TimedConnection}}
+        _app = create_app()
+        _app.config['WTF_CSRF_ENABLED'] = False
+        with _app.app_context():
+            instrument_writes(db.engine)
+    return _app
+
+class TestClientRegister:
+    def __init__(self, username, password):
+        self.client = get_app().test_client()
+        response = self.client.post('/login', data={'username': username, 'password': password})
+        if response.status_code != 302:
+            raise RuntimeError(f'Login de {username} falhou.')
+
+    def checkout(self, payload):
+        response = self.client.post('/pdv/checkout', json=payload)
+        return response.status_code, response.get_json(silent=True) or {}
+
+class HttpRegister:
+    def __init__(self, base_url, username, password):
+        self.base_url = base_url.rstrip('/')
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()))
+        html = self.opener.open(f'{self.base_url}/login').read().decode('utf-8')
+        token = re.search(r'name="csrf_token" type="hidden" value="([^"]+)"', html)
+        form = {'username': username, 'password': password, 'csrf_token': token.group(1) if token else ''}
+        with self.opener.open(f'{self.base_url}/login', data=urlencode(form).encode('utf-8')) as response:
+            # Login aceito redireciona para o painel; recusado devolve o formulário
+            if response.geturl().rstrip('/').endswith('/login'):
+                raise RuntimeError(f'Login de {username} em {self.base_url} falhou.')
+
+    def checkout(self, payload):
+        request = Request(f'{self.base_url}/pdv/checkout', data=json.dumps(payload).encode('utf-8'),
+                          headers={'Content-Type': 'application/json'})
+        try:
+            with self.opener.open(request) as response:
+                status, body = response.status, response.read()
+        except HTTPError as e:
+            status, body = e.code, e.read()
+        # Corpo que não é JSON (ex.: sessão expirada, redirecionada para /login)
+        # conta como checkout que falhou
+        try:
+            return status, json.loads(body or b'{}')
+        except ValueError:
+            return (500 if status == 200 else status), {}
+
+def build_cart(rng, catalog, hot, args):
+    lines = {}
+    for _ in range(rng.randint(1, args.max_items)):
+        product = rng.choice(hot) if hot and rng.random() < args.hot_ratio else rng.choice(catalog)
+        line = lines.setdefault(product['id'], {'id': product['id'], 'name': product['name'], 'quantity': 0, 'price': product['price']})
+        line['quantity'] += rng.randint(1, args.max_quantity)
+    cart = list(lines.values())
+    total = round(sum(i['quantity'] * i['price'] for i in cart), 2)
+    method = rng.choice(PAYMENT_METHODS)
+    paid = float(int(total) + 1) if method == 'Dinheiro' else total
+    return {'cart': cart, 'total_amount': total, 'payment_method': method,
+            'paid_amount': paid, 'change_amount': round(paid - total, 2)}
+
+def is_lock_error(status, body):
+    return status >= 500 and 'locked' in str(body.get('message', '')).lower()
+
+def run_register(index, catalog, hot, args, barrier):
+    rng = random.Random(args.seed * 1000 + index)
+    try:
+        if args.url:
+            register = HttpRegister(args.url, args.username, args.password)
+        else:
+            register = TestClientRegister(f'caixa{index + 1}', REGISTER_PASSWORD)
+    except Exception:
+        # Libera os outros caixas da barreira em vez de deixá-los esperando
+        barrier.abort()
+        raise
+
+    stats = {'attempts': 0, 'success': 0, 'retries': 0, 'lock_errors': 0, 'out_of_stock': 0,
+             'failed': 0, 'lock_error_s': 0.0, 'lock_wait_s': None if args.url else 0.0, 'latencies': []}
+    # Todos os caixas começam juntos, depois de criar o app e fazer login; a vazão
+    # considera só o intervalo dos checkouts (time.time é comparável entre processos).
+    barrier.wait(BARRIER_TIMEOUT)
+    stats['started_at'] = time.time()
+    deadline = time.monotonic() + args.duration
+    done = 0
+    while time.monotonic() < deadline and (not args.checkouts or done < args.checkouts):
+        payload = build_cart(rng, catalog, hot, args)
+        done += 1
+        for attempt in range(args.retries + 1):
+            started, waited = time.monotonic(), write_time()
+            status, body = register.checkout(payload)
+            elapsed = time.monotonic() - started
+            if not args.url:
+                stats['lock_wait_s'] += write_time() - waited
+            stats['attempts'] += 1
+            if status == 200 and body.get('success'):
+                stats['success'] += 1
+                stats['latencies'].append(elapsed)
+                break
+            if is_lock_error(status, body):
+                stats['lock_errors'] += 1
+                stats['lock_error_s'] += elapsed
+                if attempt < args.retries:
+                    stats['retries'] += 1
+                    backoff = args.backoff * (2 ** attempt) * rng.uniform(0.5, 1.5)
+                    time.sleep(backoff)
+                    stats['lock_error_s'] += backoff
+                    continue
+                stats['failed'] += 1
+            elif status == 400:
+                stats['out_of_stock'] += 1
+            else:
+                stats['failed'] += 1
+            break
+    stats['ended_at'] = time.time()
+    return stats
+
+def seed(args):
+    from extensions import db
+    from models import Product, User
+    app = get_app()
+    with app.app_context():
+        for i in range(args.registers):
+            username = f'caixa{i + 1}'
+            if not User.query.filter_by(username=username).first():
+                user = User(username=username, email=f'{username}@pdv.com', role='user')
+                user.set_password(REGISTER_PASSWORD)
+                db.session.add(user)
+        for i in range(args.products):
+            db.session.add(Product(name=f'Produto Stress {i + 1}', price=round(5 + i * 0.5, 2),
+                                   stock=args.stock, barcode=f'STRESS-{time.time_ns()}-{i}'))
+        db.session.commit()
+        from stock import record_opening_balances
+        record_opening_balances()
+
+def totals_snapshot():
+    # Somatórios por produto usados como linha de base: vendas anteriores ao livro
+    # de estoque ou já arquivadas não entram na comparação, só o que mudou no teste.
+    from sqlalchemy import func
+    from extensions import db
+    from models import SaleItem, StockMovement
+    ledger = db.session.query(StockMovement.product_id, func.sum(StockMovement.quantity)).group_by(StockMovement.product_id)
+    sold = db.session.query(SaleItem.product_id, func.sum(SaleItem.quantity)).group_by(SaleItem.product_id)
+    return {
+        'sold': {pid: int(qty) for pid, qty in sold},
+        'ledger': {pid: int(qty) for pid, qty in ledger},
+        'ledger_sales': {pid: int(qty) for pid, qty in ledger.filter(StockMovement.movement_type == 'venda')},
+    }
+
+def load_catalog(args):
+    from models import Product
+    with get_app().app_context():
+        products = Product.query.filter(Product.stock > 0).order_by(Product.id).limit(args.products).all()
+        catalog = [{'id': p.id, 'name': p.name, 'price': float(p.price)} for p in products]
+        stock = {p.id: p.stock for p in products}
+        baseline = totals_snapshot()
+    return catalog, stock, baseline
+
+def check_consistency(initial_stock, baseline):
+    # Durante o teste, a variação de Product.stock deve bater com a do livro de
+    # estoque e as saídas do livro com os SaleItem; estoque negativo indica venda
+    # acima do disponível (oversell).
+    from models import Product
+    with get_app().app_context():
+        current = totals_snapshot()
+        delta = {key: {pid: current[key].get(pid, 0) - baseline[key].get(pid, 0) for pid in initial_stock}
+                 for key in current}
+        mismatches = []
+        for p in Product.query.filter(Product.id.in_(initial_stock)).all():
+            problems = []
+            if p.stock < 0:
+                problems.append('oversold')
+            sold_during_run = delta['sold'][p.id]
+            if p.stock != initial_stock[p.id] - sold_during_run:
+                problems.append('stock_vs_sale_items')
+            if p.stock - initial_stock[p.id] != delta['ledger'][p.id]:
+                problems.append('stock_vs_ledger')
+            if -delta['ledger_sales'][p.id] != sold_during_run:
+                problems.append('ledger_vs_sale_items')
+            if problems:
+                mismatches.append({'product_id': p.id, 'stock': p.stock, 'initial': initial_stock[p.id],
+                                   'sold': sold_during_run, 'problems': problems})
+    return {'consistent': not mismatches, 'mismatches': mismatches}
+
+def percentile(values, pct):
+    if not values:
+        return None
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100, method='inclusive')[pct - 1]
+
+def build_report(args, results, consistency):
+    wall_time = max(r['ended_at'] for r in results) - min(r['started_at'] for r in results)
+    totals = {key: sum(r[key] for r in results) for key in ('attempts', 'success', 'retries', 'lock_errors', 'out_of_stock', 'failed')}
+    latencies = sorted(l for r in results for l in r['latencies'])
+    return {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'target': args.url or 'test_client',
+        'mode': args.mode,
+        'registers': args.registers,
+        'products': args.products,
+        'hot_skus': args.hot_skus,
+        'hot_ratio': args.hot_ratio,
+        'duration_s': round(wall_time, 3),
+        **totals,
+        'lock_error_s': round(sum(r['lock_error_s'] for r in results), 3),
+        'lock_wait_s': None if args.url else round(sum(r['lock_wait_s'] for r in results), 3),
+        'throughput_per_s': round(totals['success'] / wall_time, 2) if wall_time else 0,
+        'latency_ms': {name: round(value * 1000, 2) if value is not None else None
+                       for name, value in (('p50', percentile(latencies, 50)), ('p95', percentile(latencies, 95)),
+                                           ('max', latencies[-1] if latencies else None))},
+        **consistency,
+    }
+
+def run_pool(executor, barrier, catalog, hot, args):
+    with executor:
+        futures = [executor.submit(run_register, i, catalog, hot, args, barrier) for i in range(args.registers)]
+        errors = [f.exception() for f in futures]
+    # Um caixa que falha ao subir quebra a barreira dos demais; mostra o erro original
+    failures = [e for e in errors if e is not None and not isinstance(e, threading.BrokenBarrierError)]
+    if failures or any(errors):
+        sys.exit(f'Caixa falhou antes de começar: {(failures or [e for e in errors if e])[0]}')
+    return [f.result() for f in futures]
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description='Teste de carga de checkout com vários caixas simultâneos.')
+    parser.add_argument('--registers', type=int, default=4, help='Quantidade de caixas simultâneos.')
+    parser.add_argument('--mode', choices=['threads', 'processes'], default='threads')
+    parser.add_argument('--duration', type=float, default=10.0, help='Duração em segundos.')
+    parser.add_argument('--checkouts', type=int, default=0, help='Limite de checkouts por caixa (0 = sem limite).')
+    parser.add_argument('--products', type=int, default=50, help='Tamanho do catálogo usado nos carrinhos.')
+    parser.add_argument('--stock', type=int, default=1000, help='Estoque inicial de cada produto cadastrado.')
+    parser.add_argument('--hot-skus', type=int, default=3, help='Quantos produtos são disputados por todos os caixas.')
+    parser.add_argument('--hot-ratio', type=float, default=0.5, help='Probabilidade de cada item do carrinho ser um produto disputado.')
+    parser.add_argument('--max-items', type=int, default=5, help='Máximo de linhas por carrinho.')
+    parser.add_argument('--max-quantity', type=int, default=3, help='Máximo de unidades por linha.')
+    parser.add_argument('--retries', type=int, default=3, help='Retentativas após erro de lock.')
+    parser.add_argument('--backoff', type=float, default=0.05, help='Espera base (s) entre retentativas.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--url', help='URL de um PDV em execução; sem ela usa o test client.')
+    parser.add_argument('--database-url', help='Banco do PDV (obrigatório com --url, para catálogo e verificação).')
+    parser.add_argument('--username', default='admin', help='Operador usado com --url.')
+    parser.add_argument('--password', default='admin123', help='Senha do operador usado com --url.')
+    parser.add_argument('--report', default=os.path.join(tempfile.gettempdir(), 'pdv_stress_report.jsonl'),
+                        help='Arquivo JSONL onde o resultado é acrescentado.')
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.url and not args.database_url:
+        sys.exit('--database-url é obrigatório com --url.')
+    if not args.database_url:
+        args.database_url = 'sqlite:///' + os.path.join(tempfile.mkdtemp(prefix='pdv_stress_'), 'pdv.db')
+    # Config lê DATABASE_URL na importação; os processos filhos herdam a variável
+    os.environ['DATABASE_URL'] = args.database_url
+    if not args.url:
+        seed(args)
+
+    catalog, initial_stock, baseline = load_catalog(args)
+    if not catalog:
+        sys.exit('Nenhum produto com estoque disponível.')
+    hot = catalog[:args.hot_skus]
+
+    if args.mode == 'threads':
+        results = run_pool(ThreadPoolExecutor(max_workers=args.registers), threading.Barrier(args.registers), catalog, hot, args)
+    else:
+        # spawn: cada processo cria o próprio app e conexões, sem herdar as do pai
+        context = multiprocessing.get_context('spawn')
+        with context.Manager() as manager:
+            executor = ProcessPoolExecutor(max_workers=args.registers, mp_context=context)
+            results = run_pool(executor, manager.Barrier(args.registers), catalog, hot, args)
+
+    report = build_report(args, results, check_consistency(initial_stock, baseline))
+    with open(args.report, 'a', encoding='utf-8') as f:
+        f.write(json.dumps(report) + '\n')
+    print(json.dumps(report, indent=2))
+    if args.url:
+        print('lock_wait_s indisponível com --url: a espera por lock acontece no processo do servidor.')
+    print(f'Relatório acrescentado em {args.report}')
+    return 0 if report['consistent'] and not report['failed'] else 1
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,297 @@
+import gzip
+import json
+import os
+import sqlite3
+import zlib
+from datetime import datetime, timedelta
+
+import brotli
+from sqlalchemy import func
+
+import archive
+import stock
+from app import create_app
+from archive import archive_sales, archived_periods
+from config import Config
+from extensions import assets, db
+from models import Product, Sale, SaleItem, StockMovement, StockSnapshot, User
+
+
+class FakeClock:
+    def __init__(self, start):
+        self.current = start
+
+    def now(self):
+        return self.current
+
+
+def test_stock_as_of_matches_full_replay(app, monkeypatch):
+    clock = FakeClock(datetime(2026, 1, 1, 9))
+    monkeypatch.setattr(stock, 'datetime', clock)
+    with app.app_context():
+        product = Product(name='Cerveja', price=10, stock=0, barcode='1')
+        db.session.add(product)
+        db.session.commit()
+        deltas = [20, -3, -2, 5, -4, -1, -6, 10, -2, -3, -1, 8, -5]
+        for i, delta in enumerate(deltas):
+            clock.current = datetime(2026, 1, 1, 9) + timedelta(hours=10 * i)
+            stock.record_movement(product, delta, 'entrada' if delta > 0 else 'venda')
+        db.session.commit()
+        assert StockSnapshot.query.count() == len(deltas) // 3
+
+        for day in range(8):
+            as_of = datetime(2026, 1, 1) + timedelta(days=day)
+            replay = sum(m.quantity for m in StockMovement.query.filter(StockMovement.timestamp < as_of))
+            assert stock.stock_as_of(as_of).get(product.id, 0) == replay
+
+
+def test_stock_report_rejects_as_of_outside_ledger(app, client):
+    with app.app_context():
+        db.session.add(Product(name='Cerveja', price=10, stock=5, barcode='1'))
+        db.session.commit()
+        stock.record_opening_balances()
+    today = datetime.now().date()
+
+    response = client.get(f'/reports/stock?as_of={today - timedelta(days=1)}')
+    assert response.status_code == 400
+    assert response.json['success'] is False
+    assert client.get('/reports/stock?as_of=ontem').status_code == 400
+
+    response = client.get(f'/reports/stock?as_of={today}')
+    assert response.status_code == 200
+    assert response.json['products']['rows'][0][1] == 5
+
+
+def test_take_snapshots_ignores_movement_committed_mid_snapshot(app, monkeypatch, tmp_path):
+    with app.app_context():
+        product = Product(name='Cerveja', price=10, stock=0, barcode='1')
+        db.session.add(product)
+        db.session.commit()
+        stock.record_movement(product, 10, 'entrada')
+        db.session.commit()
+
+        # Outro caixa grava uma venda entre a leitura da última movimentação e a soma
+        pending = stock._pending_since_snapshot
+        def racing_checkout(product_id, upto_id=None):
+            with sqlite3.connect(tmp_path / 'pdv.db') as conn:
+                conn.execute("INSERT INTO stock_movements (product_id, quantity, movement_type, timestamp) "
+                             "VALUES (?, -4, 'venda', ?)", (product_id, datetime.now()))
+            return pending(product_id, upto_id)
+        monkeypatch.setattr(stock, '_pending_since_snapshot', racing_checkout)
+        stock.take_snapshots()
+
+        ledger = sum(m.quantity for m in StockMovement.query)
+        assert ledger == 6
+        assert stock.stock_as_of(datetime.now() + timedelta(seconds=1))[product.id] == 6
+
+
+def test_opening_balances_are_recorded_once(app, tmp_path, monkeypatch):
+    with app.app_context():
+        product = Product(name='Cerveja', price=10, stock=7, barcode='1')
+        db.session.add(product)
+        db.session.commit()
+    # Cada worker que sobe chama record_opening_balances; só o primeiro lança
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f"sqlite:///{tmp_path / 'pdv.db'}")
+    for _ in range(2):
+        other = create_app()
+        with other.app_context():
+            db.session.remove()
+            db.engine.dispose()
+    with app.app_context():
+        assert stock.record_opening_balances() == 0
+        assert [(m.quantity, m.note) for m in StockMovement.query] == [(7, 'Saldo inicial')]
+
+
+def add_sale(product, timestamp, quantity, payment_method='Pix', user_id=1):
+    total = product.price * quantity
+    sale = Sale(user_id=user_id, total_amount=total, payment_method=payment_method,
+                paid_amount=total, change_amount=0, timestamp=timestamp)
+    db.session.add(sale)
+    db.session.flush()
+    db.session.add(SaleItem(sale_id=sale.id, product_id=product.id, quantity=quantity, price_at_sale=product.price))
+    return sale
+
+
+def test_reports_union_archived_sales(app, client):
+    with app.app_context():
+        old_product = Product(name='Vinho', price=30, stock=0, barcode='1')
+        product = Product(name='Cerveja', price=10, stock=100, barcode='2')
+        db.session.add_all([old_product, product])
+        db.session.flush()
+        add_sale(old_product, datetime(2023, 3, 1, 10), 2)
+        add_sale(product, datetime(2024, 5, 2, 11), 1)
+        add_sale(product, datetime(2024, 6, 2, 12), 3, 'Dinheiro')
+        add_sale(product, datetime.now(), 4)
+        db.session.commit()
+        old_product_id = old_product.id
+
+    urls = ['/reports/top_products', '/reports/abc_curve', '/reports/cash_flow?start_date=2024-01-01&end_date=2099-12-31']
+    before = [client.get(url).json for url in urls]
+
+    # O arquivamento roda em outro app (como o `flask archive-sales`), enquanto
+    # o pool de conexões do app que serve os relatórios continua aberto.
+    archiver = create_app()
+    with archiver.app_context():
+        assert archive_sales(6) == 3
+        assert Sale.query.count() == 1
+    assert archived_periods(app) == [(2023, 2023), (2024, 2024)]
+
+    assert [client.get(url).json for url in urls] == before
+    assert before[2]['total_general'] == 80.0
+
+    client.post(f'/product/delete/{old_product_id}')
+    with app.app_context():
+        assert db.session.get(Product, old_product_id) is not None
+
+
+def test_archive_folds_oldest_years_past_attach_limit(app, client, monkeypatch):
+    monkeypatch.setattr(archive, 'MAX_ATTACHED', 3)
+    with app.app_context():
+        product = Product(name='Cerveja', price=10, stock=100, barcode='1')
+        db.session.add(product)
+        db.session.flush()
+        for year in range(2018, 2023):
+            add_sale(product, datetime(year, 6, 1, 10), year - 2017)
+        add_sale(product, datetime.now(), 1)
+        db.session.commit()
+
+        assert archive_sales(6) == 5
+        assert archived_periods() == [(2018, 2020), (2021, 2021), (2022, 2022)]
+        sales, items = archive.sales_tables()
+        assert db.session.query(func.sum(items.c.quantity)).scalar() == 16
+        assert archive.sales_tables(datetime(2019, 1, 1), datetime(2019, 12, 31))[0] is not Sale.__table__
+
+    # Um arquivo a mais (ex.: restaurado de um backup) só afeta consultas que
+    # precisam de todos os períodos; vendas continuam funcionando.
+    with app.app_context():
+        archive._sync_archive_schema((2017, 2017))
+    cart = [{'id': 1, 'name': 'Cerveja', 'quantity': 1, 'price': 10}]
+    response = client.post('/pdv/checkout', json={'cart': cart, 'total_amount': 10, 'payment_method': 'Pix',
+                                                  'paid_amount': 10, 'change_amount': 0})
+    assert response.json['success']
+    with app.app_context():
+        assert archive_sales(6) == 0
+        assert archived_periods() == [(2017, 2020), (2021, 2021), (2022, 2022)]
+    assert client.get('/reports/top_products').json[0]['quantity'] == 17
+
+
+def test_shift_totals_match_cash_flow(app, client):
+    with app.app_context():
+        operator = User(username='caixa1', email='caixa1@pdv.com', role='user')
+        operator.set_password('caixa123')
+        product = Product(name='Cerveja', price=10, stock=100, barcode='1')
+        db.session.add_all([operator, product])
+        db.session.commit()
+        product_id = product.id
+
+    register = app.test_client()
+    register.post('/login', data={'username': 'caixa1', 'password': 'caixa123'})
+    assert register.post('/shift/open', json={'opening_cash': 'abc'}).status_code == 400
+    assert register.post('/shift/open', json={'opening_cash': 'NaN'}).status_code == 400
+    assert register.post('/shift/open', json={'opening_cash': '50,00'}).json['shift']['opening_cash'] == 50
+    for method, quantity in [('Dinheiro', 2), ('Pix', 1), ('Cartao Credito', 3), ('Dinheiro', 1), ('Cartao Debito', 2)]:
+        cart = [{'id': product_id, 'name': 'Cerveja', 'quantity': quantity, 'price': 10}]
+        response = register.post('/pdv/checkout', json={'cart': cart, 'total_amount': quantity * 10, 'payment_method': method,
+                                                         'paid_amount': quantity * 10, 'change_amount': 0})
+        assert response.json['success']
+    assert register.post('/shift/close', json={'closing_cash': 'x'}).status_code == 400
+    shift = register.post('/shift/close', json={'closing_cash': 'R$ 75,00'}).json['shift']
+    assert shift['closing_cash'] == 75
+
+    operator_flow = client.get('/reports/cash_flow').json['operators']['caixa1']
+    for key in ('Dinheiro', 'Cartao Credito', 'Cartao Debito', 'Pix', 'Total', 'VendasCount'):
+        assert shift[key] == operator_flow[key]
+    assert shift['items_count'] == 9
+    assert shift['expected_cash'] == 80.0
+    assert shift['difference'] == -5.0
+
+    # Operador com caixas registrados não pode ser excluído
+    with app.app_context():
+        Sale.query.filter_by(shift_id=shift['id']).update({'user_id': 1})
+        db.session.commit()
+    client.post('/user/delete/2')
+    with app.app_context():
+        assert db.session.get(User, 2) is not None
+
+
+def test_create_app_adds_new_columns_to_existing_tables(tmp_path, monkeypatch):
+    # Banco anterior aos turnos: sales sem shift_id, como o instance/pdv.db distribuído
+    path = tmp_path / 'old.db'
+    conn = sqlite3.connect(path)
+    conn.execute('CREATE TABLE sales (id INTEGER PRIMARY KEY, user_id INTEGER NOT NULL, total_amount FLOAT NOT NULL, '
+                 'payment_method VARCHAR(50) NOT NULL, paid_amount FLOAT NOT NULL, change_amount FLOAT NOT NULL, timestamp DATETIME)')
+    conn.commit()
+    conn.close()
+    monkeypatch.setattr(Config, 'SQLALCHEMY_DATABASE_URI', f'sqlite:///{path}')
+    monkeypatch.setattr(Config, 'ARCHIVE_DIR', str(tmp_path / 'archive'))
+
+    app = create_app()
+    with app.app_context():
+        assert Sale.query.count() == 0
+        db.engine.dispose()
+    columns = [row[1] for row in sqlite3.connect(path).execute('PRAGMA table_info(sales)')]
+    assert 'shift_id' in columns
+
+
+def test_assets_serve_fingerprinted_precompressed_files(app, client):
+    fingerprinted = assets.files['js/pdv.js']
+    url = f'/assets/{fingerprinted}'
+    assert url in client.get('/pdv').get_data(as_text=True)
+    with open(os.path.join(app.static_folder, 'js', 'pdv.js'), 'rb') as f:
+        original = f.read()
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip, br'})
+    assert response.headers['Content-Encoding'] == 'br'
+    assert brotli.decompress(response.data) == original
+    assert response.headers['Cache-Control'] == 'public, max-age=31536000, immutable'
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+    response = client.get(url, headers={'Accept-Encoding': 'gzip'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == original
+
+    response = client.get(url, headers={'Accept-Encoding': 'identity'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == original
+    etag = response.headers['ETag']
+
+    assert client.get(url, headers={'Accept-Encoding': 'identity', 'If-None-Match': etag}).status_code == 304
+    assert client.get(url, headers={'Accept-Encoding': 'gzip', 'If-None-Match': etag}).status_code == 200
+
+    # Hash antigo redireciona para a versão atual; arquivo desconhecido é 404
+    response = client.get('/assets/js/pdv.000000000000.js')
+    assert response.status_code == 302
+    assert response.headers['Location'].endswith(url)
+    assert client.get('/assets/js/nada.000000000000.js').status_code == 404
+
+    app.debug = True
+    assert '/static/js/pdv.js' in client.get('/pdv').get_data(as_text=True)
+
+
+def test_compress_negotiates_large_responses_only(app, client):
+    with app.app_context():
+        db.session.add_all([Product(name=f'Produto {i}', price=i + 0.5, stock=i, barcode=str(i)) for i in range(1, 61)])
+        db.session.commit()
+        stock.record_opening_balances()
+
+    response = client.get('/reports/stock', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    report = json.loads(gzip.decompress(response.data))
+    assert report['products']['columns'] == ['name', 'stock', 'price', 'value']
+    assert report['products']['rows'][0] == ['Produto 1', 1, 1.5, 1.5]
+
+    response = client.get('/reports/stock', headers={'Accept-Encoding': 'deflate'})
+    assert response.headers['Content-Encoding'] == 'deflate'
+    assert json.loads(zlib.decompress(response.data)) == report
+
+    assert 'Content-Encoding' not in client.get('/reports/stock').headers
+    small = client.get('/shift/current', headers={'Accept-Encoding': 'gzip'})
+    assert len(small.data) < app.config['COMPRESS_MIN_SIZE']
+    assert 'Content-Encoding' not in small.headers
+
+    # /assets já negocia suas variantes; o ETag não pode cobrir um corpo recomprimido
+    url = f"/assets/{assets.files['js/pdv.js']}"
+    response = client.get(url, headers={'Accept-Encoding': 'deflate'})
+    assert 'Content-Encoding' not in response.headers
+    assert response.headers['ETag'].endswith('-identity"')